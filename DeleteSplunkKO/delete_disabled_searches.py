@@ -4,15 +4,38 @@ import sys
 import os
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 import argparse
 import logging
+import threading
 import yaml
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from urllib.parse import quote
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Use libyaml's C loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+# (connect, read) timeout applied to every REST call
+REQUEST_TIMEOUT = (3, 10)
+
+# Number of saved searches fetched per page when building the search index
+SEARCH_PAGE_SIZE = 1000
+
+# Default number of concurrent workers and minimum HTTP connection pool size.
+# The pool always grows to at least the worker count so workers never queue for a connection.
+DEFAULT_MAX_WORKERS = 16
+POOL_MAXSIZE = 32
+
 # Logger will be initialized in main() after loading config
 logger = None
 
@@ -24,14 +47,83 @@ class SplunkSearchManager:
         self.password = config['splunk']['password']
         self.protocol = config['splunk']['protocol']
         self.verify_ssl = config['splunk']['verify_ssl']
+        self.max_workers = config['settings'].get('max_workers', DEFAULT_MAX_WORKERS)
         self.base_url = f"{self.protocol}://{self.splunk_host}:{self.port}/servicesNS/-/-"
         self.user_base_url = f"{self.protocol}://{self.splunk_host}:{self.port}/servicesNS/{self.username}/-"
         self.auth = HTTPBasicAuth(self.username, self.password)
-        
-    def get_saved_search(self, search_name, specified_app=None, specified_owner=None):
-        """Get details of a specific saved search"""
-        encoded_name = quote(search_name, safe='')
 
+        # Reuse one pooled keep-alive session for all REST calls so each
+        # namespace probe doesn't pay for a new TCP/TLS handshake
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.verify = self.verify_ssl
+        # Back off on throttling and transient server errors, honouring Retry-After.
+        # The final response is returned rather than raised so callers can log its status.
+        retries = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'DELETE']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.session.mount(f"{self.protocol}://", HTTPAdapter(pool_connections=16, pool_maxsize=max(POOL_MAXSIZE, self.max_workers), max_retries=retries))
+
+        # name -> list of (owner, app, disabled), built by _load_all_searches()
+        self._index = None
+
+        # Fallback probe caches: (user, app) pairs that returned 200, most recent first,
+        # and (name, user, app) triples that returned 404
+        self._hit_order = []
+        self._neg_cache = set()
+        self._cache_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the underlying HTTP session"""
+        self.session.close()
+
+    def _load_all_searches(self):
+        """Fetch every visible saved search once and index it by name"""
+        url = f"{self.base_url}/saved/searches"
+        index = {}
+        offset = 0
+        while True:
+            params = {
+                'output_mode': 'json',
+                'count': SEARCH_PAGE_SIZE,
+                'offset': offset,
+                'f': ['disabled', 'eai:acl'],
+            }
+            try:
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+                if response.status_code != 200:
+                    logger.warning(f"Unable to list saved searches (HTTP {response.status_code}), falling back to per-search lookups")
+                    return
+                entries = response.json().get('entry', [])
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Unable to list saved searches ({e}), falling back to per-search lookups")
+                return
+
+            for entry in entries:
+                acl = entry.get('acl', {})
+                disabled = entry.get('content', {}).get('disabled', False)
+                index.setdefault(entry['name'], []).append((acl.get('owner', '-'), acl.get('app', '-'), disabled))
+
+            if len(entries) < SEARCH_PAGE_SIZE:
+                break
+            offset += len(entries)
+
+        self._index = index
+        logger.info(f"Indexed {sum(len(v) for v in index.values())} saved searches from {url}")
+
+    def _namespaces_to_try(self, specified_app=None, specified_owner=None):
+        """(user, app) namespaces a saved search is looked up in, in priority order"""
         # If app is specified, try it first, then fallback to common apps
         if specified_app:
             apps_to_try = [specified_app, 'search', 'system', '-']
@@ -44,25 +136,81 @@ class SplunkSearchManager:
         else:
             users_to_try = [self.username, 'nobody', '-']
 
-        for app in apps_to_try:
-            for user in users_to_try:
-                url = f"{self.protocol}://{self.splunk_host}:{self.port}/servicesNS/{user}/{app}/saved/searches/{encoded_name}"
-                try:
-                    response = requests.get(url, auth=self.auth, verify=self.verify_ssl)
-                    if response.status_code == 200:
-                        logger.debug(f"Found search '{search_name}' in namespace user='{user}', app='{app}'")
-                        return response.text, url, user, app
-                    elif response.status_code != 404:
-                        logger.debug(f"Non-404 error for {url}: {response.status_code}")
-                except requests.exceptions.RequestException as e:
-                    logger.debug(f"Request error for {url}: {e}")
-                    continue
+        return [(user, app) for app in apps_to_try for user in users_to_try]
+
+    def _lookup_index(self, search_name, specified_app=None, specified_owner=None):
+        """Find a saved search in the prebuilt index, honouring app/owner hints"""
+        candidates = self._index.get(search_name) if self._index is not None else None
+        if not candidates:
+            return None
+
+        # When a name exists in several namespaces, pick the copy the per-namespace
+        # probes would resolve first, so the index never selects a different object
+        namespaces = self._namespaces_to_try(specified_app, specified_owner)
+
+        def probe_rank(candidate):
+            owner, app, _ = candidate
+            for rank, (user, probe_app) in enumerate(namespaces):
+                if probe_app in ('-', app) and user in ('-', owner):
+                    return rank
+            return len(namespaces)
+
+        return min(candidates, key=probe_rank)
+
+    def get_saved_search(self, search_name, specified_app=None, specified_owner=None):
+        """Get details of a specific saved search"""
+        encoded_name = quote(search_name, safe='')
+
+        indexed = self._lookup_index(search_name, specified_app, specified_owner)
+        if indexed:
+            user, app, disabled = indexed
+            url = f"{self.protocol}://{self.splunk_host}:{self.port}/servicesNS/{user}/{app}/saved/searches/{encoded_name}"
+            logger.debug(f"Found search '{search_name}' in index with user='{user}', app='{app}'")
+            return {'disabled': disabled}, url, user, app
+
+        # Namespaces tied to the app/owner hints keep their place up front; the rest are
+        # tried in order of recent hits so later searches find their namespace sooner
+        with self._cache_lock:
+            hit_rank = {pair: rank for rank, pair in enumerate(self._hit_order)}
+
+        def probe_order(pair):
+            user, app = pair
+            if app == specified_app or user == specified_owner:
+                return (0, 0)
+            return (1, hit_rank.get(pair, len(hit_rank)))
+
+        pairs = sorted(self._namespaces_to_try(specified_app, specified_owner), key=probe_order)
+
+        for user, app in pairs:
+            if (search_name, user, app) in self._neg_cache:
+                continue
+            url = f"{self.protocol}://{self.splunk_host}:{self.port}/servicesNS/{user}/{app}/saved/searches/{encoded_name}"
+            try:
+                response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+                if response.status_code == 200:
+                    logger.debug(f"Found search '{search_name}' in namespace user='{user}', app='{app}'")
+                    with self._cache_lock:
+                        if (user, app) in self._hit_order:
+                            self._hit_order.remove((user, app))
+                        self._hit_order.insert(0, (user, app))
+                    return response.text, url, user, app
+                elif response.status_code == 404:
+                    with self._cache_lock:
+                        self._neg_cache.add((search_name, user, app))
+                else:
+                    logger.debug(f"Non-404 error for {url}: {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                logger.debug(f"Request error for {url}: {e}")
+                continue
 
         logger.warning(f"Saved search '{search_name}' not found in any namespace")
         return None, None, None, None
     
     def is_search_disabled(self, search_details):
         """Check if a saved search is disabled based on its details"""
+        if isinstance(search_details, dict):
+            # Entry from the saved search index
+            return str(search_details.get('disabled')).lower() in ('1', 'true')
         if search_details:
             # Parse the response to check if disabled=1
             return 'disabled">1<' in search_details or 'disabled">true<' in search_details
@@ -95,7 +243,7 @@ class SplunkSearchManager:
             logger.debug(f"Attempting deletion with user={del_user}, app={del_app}")
             
             try:
-                response = requests.delete(url, auth=self.auth, verify=self.verify_ssl)
+                response = self.session.delete(url, timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     logger.info(f"Successfully deleted saved search: {search_name} (user={del_user}, app={del_app})")
                     return True
@@ -113,7 +261,7 @@ class SplunkSearchManager:
         """Test connection to Splunk server"""
         url = f"{self.base_url}/apps/local"
         try:
-            response = requests.get(url, auth=self.auth, verify=self.verify_ssl, timeout=10)
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 logger.info("Successfully connected to Splunk server")
                 return True
@@ -125,6 +273,37 @@ class SplunkSearchManager:
             logger.error(f"Connection error: {e}")
             return False
     
+    def _process_one(self, search, dry_run=False):
+        """Process a single (search_name, app, owner) entry and return its status"""
+        search_name, specified_app, specified_owner = search
+        if specified_app and specified_owner:
+            logger.info(f"Processing: {search_name} (app: {specified_app}, owner: {specified_owner})")
+        elif specified_app:
+            logger.info(f"Processing: {search_name} (app: {specified_app})")
+        elif specified_owner:
+            logger.info(f"Processing: {search_name} (owner: {specified_owner})")
+        else:
+            logger.info(f"Processing: {search_name}")
+
+        # Check if search exists and is disabled
+        search_details, search_url, user, app = self.get_saved_search(search_name, specified_app, specified_owner)
+        if search_details is None:
+            return 'not_found'
+
+        if not self.is_search_disabled(search_details):
+            logger.info(f"Skipping enabled saved search: {search_name} (user={user}, app={app})")
+            return 'skipped'
+
+        if dry_run:
+            logger.info(f"[DRY RUN] Would delete disabled saved search: {search_name} (user={user}, app={app})")
+            return 'deleted'
+
+        if self.delete_saved_search(search_name, user, app):
+            return 'deleted'
+
+        logger.error(f"Failed to delete: {search_name}")
+        return 'error'
+
     def process_searches_from_file(self, file_path, dry_run=False):
         """Process saved searches from a text file"""
         # Test connection first
@@ -175,49 +354,21 @@ class SplunkSearchManager:
             return
 
         logger.info(f"Found {len(searches_to_process)} saved searches to process")
-        
-        deleted_count = 0
-        skipped_count = 0
-        not_found_count = 0
-        error_count = 0
-
-        for search_name, specified_app, specified_owner in searches_to_process:
-            if specified_app and specified_owner:
-                logger.info(f"Processing: {search_name} (app: {specified_app}, owner: {specified_owner})")
-            elif specified_app:
-                logger.info(f"Processing: {search_name} (app: {specified_app})")
-            elif specified_owner:
-                logger.info(f"Processing: {search_name} (owner: {specified_owner})")
-            else:
-                logger.info(f"Processing: {search_name}")
 
-            # Check if search exists and is disabled
-            search_details, search_url, user, app = self.get_saved_search(search_name, specified_app, specified_owner)
-            if search_details is None:
-                not_found_count += 1
-                continue
-
-            if self.is_search_disabled(search_details):
-                if dry_run:
-                    logger.info(f"[DRY RUN] Would delete disabled saved search: {search_name} (user={user}, app={app})")
-                    deleted_count += 1
-                else:
-                    if self.delete_saved_search(search_name, user, app):
-                        deleted_count += 1
-                    else:
-                        logger.error(f"Failed to delete: {search_name}")
-                        error_count += 1
-            else:
-                logger.info(f"Skipping enabled saved search: {search_name} (user={user}, app={app})")
-                skipped_count += 1
+        # One paged list call replaces the per-name namespace probing
+        self._load_all_searches()
         
-        logger.info(f"Summary: {deleted_count} deleted, {skipped_count} skipped (enabled), {not_found_count} not found, {error_count} errors")
+        # Searches are independent and the work is network-bound, so process them concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = Counter(executor.map(self._process_one, searches_to_process, repeat(dry_run)))
+
+        logger.info(f"Summary: {results['deleted']} deleted, {results['skipped']} skipped (enabled), {results['not_found']} not found, {results['error']} errors")
 
 def load_config(config_path):
     """Load configuration from YAML file"""
     try:
         with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=YAMLLoader)
         return config
     except FileNotFoundError:
         logger.error(f"Config file not found: {config_path}")
@@ -255,6 +406,12 @@ def validate_config(config):
     if config['settings']['log_level'].upper() not in valid_log_levels:
         logger.error(f"Invalid log level. Must be one of: {', '.join(valid_log_levels)}")
         return False
+
+    # Validate worker count
+    max_workers = config['settings'].get('max_workers', DEFAULT_MAX_WORKERS)
+    if isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers < 1:
+        logger.error("max_workers must be a positive integer")
+        return False
     
     return True
 
@@ -274,8 +431,16 @@ def main():
     parser.add_argument('--password', help='Override password from config')
     parser.add_argument('--port', type=int, help='Override port from config')
     parser.add_argument('--protocol', choices=['http', 'https'], help='Override protocol from config')
+    parser.add_argument('--workers', type=int, help='Override number of concurrent workers from config')
     
     args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error('--workers must be a positive integer')
+    
+    # Until logging is configured from the config file, config errors still reach
+    # stderr through logging's last-resort handler
+    global logger
+    logger = logging.getLogger(__name__)
     
     # Load configuration
     config = load_config(args.config)
@@ -285,7 +450,6 @@ def main():
         sys.exit(1)
     
     # Setup logging
-    global logger
     logger = setup_logging(config['settings']['log_level'])
     
     # Override config with command line arguments if provided
@@ -299,6 +463,8 @@ def main():
         config['splunk']['port'] = args.port
     if args.protocol:
         config['splunk']['protocol'] = args.protocol
+    if args.workers is not None:
+        config['settings']['max_workers'] = args.workers
     
     # Override dry_run from config if command line argument is provided
     dry_run = args.dry_run or config['settings'].get('dry_run', False)
@@ -307,8 +473,8 @@ def main():
     logger.info(f"SSL verification: {'enabled' if config['splunk'].get('verify_ssl', False) else 'disabled'}")
     logger.info(f"Mode: {'DRY RUN' if dry_run else 'LIVE'}")
     
-    manager = SplunkSearchManager(config)
-    manager.process_searches_from_file(args.file, dry_run)
+    with SplunkSearchManager(config) as manager:
+        manager.process_searches_from_file(args.file, dry_run)
 
 if __name__ == "__main__":
     main()
@@ -6,16 +6,109 @@ Monitors CSV files and outputs new records as JSON events to stdout.
 """
 
 import os
+import re
 import sys
 import csv
 import json
 import time
+import queue
+import signal
 import glob
-import hashlib
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Set
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the Splunk-bundled Python only has the stdlib
+    orjson = None
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; without it run_continuous polls
+    FileSystemEventHandler = object
+    Observer = None
+
+# Number of events written to stdout per flush
+OUTPUT_BATCH_SIZE = 500
+
+# Minimum seconds between state file writes while running continuously
+STATE_SAVE_INTERVAL = 5
+
+# Key holding the extra fields of a row longer than the header. csv.DictReader's
+# default of None was written out by json as "null"; a string keeps that output
+# and is also accepted by orjson.
+CSV_RESTKEY = "null"
+
+# Column names checked for an event timestamp, in order
+TIMESTAMP_FIELDS = ('timestamp', 'time', 'datetime', 'date', 'created_at', 'updated_at')
+
+# YYYY-MM-DD with optional [T ]HH:MM:SS[.ffffff][Z]
+ISO_TIMESTAMP_RE = re.compile(
+    r'(\d{4})-(\d{1,2})-(\d{1,2})(?:[T ](\d{1,2}):(\d{1,2}):(\d{1,2})(?:\.(\d{1,6}))?Z?)?')
+
+# MM/DD/YYYY HH:MM:SS, or DD/MM/YYYY HH:MM:SS when the first reading is not a valid date
+SLASH_TIMESTAMP_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{1,2}):(\d{1,2})')
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize obj to compact UTF-8 JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def json_loads(data: bytes) -> Any:
+    """Deserialize UTF-8 JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def build_row(header: List[str], fields: List[str]) -> Dict[str, Any]:
+    """
+    Map a CSV record's fields onto the header the way csv.DictReader does.
+    
+    Fields beyond the header are kept as a list under CSV_RESTKEY, and columns
+    missing from a short record are set to None.
+    """
+    row = dict(zip(header, fields))
+    if len(fields) > len(header):
+        row[CSV_RESTKEY] = fields[len(header):]
+    elif len(fields) < len(header):
+        for name in header[len(fields):]:
+            row[name] = None
+    return row
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Parse a timestamp string into a Unix timestamp.
+    
+    Date/time strings are interpreted as local time; anything else is
+    treated as a numeric epoch value.
+    
+    Raises:
+        ValueError: If the value is not a recognised timestamp
+    """
+    match = ISO_TIMESTAMP_RE.fullmatch(value)
+    if match:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+        return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                        int(second or 0), microsecond).timestamp()
+    
+    match = SLASH_TIMESTAMP_RE.fullmatch(value)
+    if match:
+        first, second_part, year, hour, minute, second = map(int, match.groups())
+        try:
+            return datetime(year, first, second_part, hour, minute, second).timestamp()
+        except ValueError:
+            return datetime(year, second_part, first, hour, minute, second).timestamp()
+    
+    return float(value)
 
 class SplunkCSVInput:
     def __init__(self, data_dir: str = "data", state_dir: str = "state", 
@@ -47,6 +140,9 @@ class SplunkCSVInput:
         
         # Track processed files and their states
         self.file_states = {}
+        self._state_dirty = False
+        self._last_saved_at = 0.0
+        self._save_min_interval = STATE_SAVE_INTERVAL
         self.load_state()
     
     def load_state(self) -> None:
@@ -54,134 +150,205 @@ class SplunkCSVInput:
         state_file = self.state_dir / "csv_state.json"
         try:
             if state_file.exists():
-                with open(state_file, 'r') as f:
-                    self.file_states = json.load(f)
+                self.file_states = json_loads(state_file.read_bytes())
                 self.logger.info(f"Loaded state for {len(self.file_states)} files")
         except Exception as e:
             self.logger.error(f"Error loading state: {e}")
             self.file_states = {}
     
     def save_state(self) -> None:
-        """Save processing state to disk."""
+        """Save processing state to disk if it changed, replacing the file atomically."""
+        if not self._state_dirty:
+            return
+        
         state_file = self.state_dir / "csv_state.json"
         try:
-            with open(state_file, 'w') as f:
-                json.dump(self.file_states, f, indent=2)
+            tmp_file = state_file.with_suffix('.tmp')
+            tmp_file.write_bytes(json_dumps(self.file_states))
+            os.replace(tmp_file, state_file)
+            self._state_dirty = False
+            self._last_saved_at = time.time()
         except Exception as e:
             self.logger.error(f"Error saving state: {e}")
     
-    def get_file_hash(self, file_path: Path) -> str:
-        """Get MD5 hash of file for change detection."""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except Exception as e:
-            self.logger.error(f"Error hashing file {file_path}: {e}")
-            return ""
-    
-    def should_process_file(self, file_path: Path) -> bool:
-        """Check if file needs processing based on modification time and hash."""
+    def should_process_file(self, file_path: Path, stat: Optional[os.stat_result] = None) -> bool:
+        """
+        Check if file needs processing based on modification time and size.
+        
+        Args:
+            file_path: Path to the CSV file
+            stat: Stat result already obtained while scanning, if any
+        """
         file_str = str(file_path)
         
         try:
-            stat = file_path.stat()
-            current_mtime = stat.st_mtime
-            current_size = stat.st_size
-            current_hash = self.get_file_hash(file_path)
+            if stat is None:
+                stat = file_path.stat()
+            state = self.file_states.setdefault(file_str, {
+                "last_mtime": 0,
+                "last_size": 0,
+                "last_offset": 0
+            })
             
-            if file_str not in self.file_states:
-                # New file
-                self.file_states[file_str] = {
-                    "last_mtime": current_mtime,
-                    "last_size": current_size,
-                    "last_hash": current_hash,
-                    "last_row": 0
-                }
-                return True
+            # Content hashes from older state files are no longer used
+            if state.pop("last_hash", None) is not None:
+                self._state_dirty = True
             
-            state = self.file_states[file_str]
+            # A different inode means the file was replaced (e.g. rotated), so the
+            # stored offset belongs to the old file. st_ino is 0 where unsupported.
+            if stat.st_ino and stat.st_ino != state.get("inode", stat.st_ino):
+                self.logger.warning(f"{file_path.name} was replaced, reprocessing from the start")
+                state["last_offset"] = 0
+                state["header"] = None
+                state.pop("last_row", None)
+                state["last_size"] = None
+            if stat.st_ino and stat.st_ino != state.get("inode"):
+                self._state_dirty = True
+                state["inode"] = stat.st_ino
             
-            # Check if file has been modified
-            if (current_mtime != state["last_mtime"] or 
-                current_size != state["last_size"] or 
-                current_hash != state["last_hash"]):
-                
-                # File has changed, update state
-                state["last_mtime"] = current_mtime
-                state["last_size"] = current_size
-                state["last_hash"] = current_hash
-                return True
-            
-            return False
+            # Appends always change size or mtime, so a stat is enough to detect new data
+            changed = stat.st_size != state["last_size"] or stat.st_mtime != state["last_mtime"]
+            if changed:
+                self._state_dirty = True
+                state["last_mtime"] = stat.st_mtime
+                state["last_size"] = stat.st_size
+            return changed
             
         except Exception as e:
             self.logger.error(f"Error checking file {file_path}: {e}")
             return False
     
-    def process_csv_file(self, file_path: Path) -> int:
+    def process_csv_file(self, file_path: Path, complete_tail: bool = True) -> int:
         """
         Process CSV file and output new records as JSON events.
         
+        Resumes from the byte offset recorded in the file state, so each poll
+        only reads data appended since the previous one.
+        
+        Args:
+            file_path: Path to the CSV file
+            complete_tail: Treat a last line without a newline as complete rather
+                than as still being written
+        
         Returns:
             Number of new records processed
         """
         file_str = str(file_path)
         processed_count = 0
+        output_buffer = []
         
         try:
-            # Get the last processed row number
-            last_row = self.file_states.get(file_str, {}).get("last_row", 0)
-            current_row = 0
+            state = self.file_states.setdefault(file_str, {})
+            self._state_dirty = True
+            
+            # Rows already emitted by a state file from before offsets were tracked
+            skip_rows = state.pop("last_row", 0) if "last_offset" not in state else 0
+            
+            # File shrank: it was truncated or replaced, so start over
+            if file_path.stat().st_size < state.get("last_offset", 0):
+                self.logger.warning(f"{file_path.name} was truncated, reprocessing from the start")
+                state["last_offset"] = 0
+                state["header"] = None
+            
+            if not state.get("last_offset"):
+                state["last_offset"] = 0
+                state["header"] = None
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                csv_reader = csv.DictReader(f)
+            with open(file_path, 'rb') as f:
+                f.seek(state["last_offset"])
+                records = self.iter_csv_records(f, state, complete_tail)
                 
-                for row in csv_reader:
-                    current_row += 1
-                    
-                    # Skip already processed rows
-                    if current_row <= last_row:
+                if not state["header"]:
+                    state["header"] = next((fields for fields in records if fields), None)
+                header = state["header"]
+                
+                # Serialize the fields that are constant for the whole file once
+                event_middle = (b',"source":' + json_dumps(file_path.name) +
+                                b',"sourcetype":' + json_dumps(self.sourcetype) +
+                                b',"event":')
+                
+                for fields in records:
+                    if not fields:
+                        continue
+                    if skip_rows:
+                        skip_rows -= 1
                         continue
                     
-                    # Create Splunk event
-                    event = self.create_splunk_event(row, file_path.name)
+                    # Create Splunk event, timestamped from the data or the current time
+                    row = build_row(header, fields)
+                    event_time = self.extract_timestamp(row)
                     
-                    # Output to stdout for Splunk consumption
-                    print(json.dumps(event), flush=True)
+                    # Buffer output for Splunk consumption, flushing in batches
+                    output_buffer.append(b'{"time":' + json_dumps(event_time) + event_middle +
+                                         json_dumps(row) + b'}')
                     processed_count += 1
-                
-                # Update last processed row
-                if file_str in self.file_states:
-                    self.file_states[file_str]["last_row"] = current_row
+                    if len(output_buffer) >= OUTPUT_BATCH_SIZE:
+                        self.write_events(output_buffer)
+                        output_buffer.clear()
                 
         except Exception as e:
             self.logger.error(f"Error processing CSV file {file_path}: {e}")
+        finally:
+            # Rows already consumed must reach stdout even if a later row failed
+            self.write_events(output_buffer)
         
         return processed_count
     
-    def create_splunk_event(self, csv_row: Dict[str, Any], source_file: str) -> Dict[str, Any]:
+    def write_events(self, events: List[bytes]) -> None:
+        """Write a batch of serialized events to stdout and flush it to Splunk."""
+        if events:
+            sys.stdout.buffer.write(b'\n'.join(events) + b'\n')
+            sys.stdout.buffer.flush()
+    
+    def iter_csv_records(self, f, state: Dict[str, Any], complete_tail: bool = True):
         """
-        Create Splunk event from CSV row.
+        Yield CSV records from a binary file positioned at the state's byte offset.
         
-        Args:
-            csv_row: Dictionary representing CSV row
-            source_file: Source CSV filename
+        The offset only advances past a record once the caller has handled it, so a
+        record still being written, including a quoted field whose embedded newline
+        is there but not the rest of it, is left for the next poll. With
+        complete_tail a last line without a newline is read as well.
+        """
+        progress = {"offset": state["last_offset"], "eof": False, "lines": []}
+        lines = self.iter_complete_lines(f, progress, complete_tail)
+        # Strict parsing is only used to spot a quoted field cut off by the end of the data
+        csv_reader = csv.reader(lines, strict=True)
+        
+        while True:
+            try:
+                records = [next(csv_reader)]
+            except StopIteration:
+                return
+            except csv.Error:
+                if progress["eof"] and not complete_tail:
+                    # Incomplete trailing record; resume from its start next poll
+                    return
+                # Quoting that only strict mode rejects; parse the record's lines
+                # leniently, as csv.DictReader did
+                records = list(csv.reader(progress["lines"]))
             
-        Returns:
-            Splunk-formatted event
+            for fields in records:
+                yield fields
+            state["last_offset"] = progress["offset"]
+            progress["lines"].clear()
+    
+    def iter_complete_lines(self, f, progress: Dict[str, Any], complete_tail: bool = True):
         """
-        # Try to extract timestamp from data or use current time
-        event_time = self.extract_timestamp(csv_row)
+        Yield complete lines from a binary file, counting the bytes read in progress.
         
-        return {
-            "time": event_time,
-            "source": source_file,
-            "sourcetype": self.sourcetype,
-            "event": csv_row
-        }
+        Unless complete_tail is set, a trailing line without a newline is taken to
+        be still being written and is left for the next poll. Lines read since the
+        last handled record are kept in progress["lines"], and progress["eof"] is
+        set once no more lines will follow.
+        """
+        for raw_line in f:
+            if not raw_line.endswith(b'\n') and not complete_tail:
+                break
+            progress["offset"] += len(raw_line)
+            line = raw_line.decode('utf-8')
+            progress["lines"].append(line)
+            yield line
+        progress["eof"] = True
     
     def extract_timestamp(self, csv_row: Dict[str, Any]) -> float:
         """
@@ -194,85 +361,150 @@ class SplunkCSVInput:
         Returns:
             Unix timestamp (float)
         """
-        timestamp_fields = ['timestamp', 'time', 'datetime', 'date', 'created_at', 'updated_at']
-        
-        for field in timestamp_fields:
+        for field in TIMESTAMP_FIELDS:
             if field in csv_row and csv_row[field]:
                 try:
-                    # Try common timestamp formats
-                    timestamp_str = str(csv_row[field]).strip()
-                    
-                    # Try parsing various formats
-                    formats = [
-                        '%Y-%m-%d %H:%M:%S',
-                        '%Y-%m-%d %H:%M:%S.%f',
-                        '%Y-%m-%dT%H:%M:%S',
-                        '%Y-%m-%dT%H:%M:%S.%f',
-                        '%Y-%m-%dT%H:%M:%SZ',
-                        '%Y-%m-%d',
-                        '%m/%d/%Y %H:%M:%S',
-                        '%d/%m/%Y %H:%M:%S'
-                    ]
-                    
-                    for fmt in formats:
-                        try:
-                            dt = datetime.strptime(timestamp_str, fmt)
-                            return dt.timestamp()
-                        except ValueError:
-                            continue
-                            
-                    # Try parsing as Unix timestamp
-                    return float(timestamp_str)
-                    
-                except (ValueError, TypeError):
+                    return parse_timestamp(str(csv_row[field]).strip())
+                except (ValueError, TypeError, OverflowError):
                     continue
         
         # Default to current time if no valid timestamp found
         return datetime.now().timestamp()
     
-    def scan_csv_files(self) -> List[Path]:
-        """Scan data directory for CSV files."""
+    def scan_csv_files(self) -> List[Tuple[Path, os.stat_result]]:
+        """Scan data directory for CSV files, returning each path with its stat result."""
         csv_files = []
         try:
             if self.data_dir.exists():
-                csv_files = list(self.data_dir.glob("*.csv"))
+                with os.scandir(self.data_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.csv') and entry.is_file():
+                            csv_files.append((self.data_dir / entry.name, entry.stat()))
                 self.logger.debug(f"Found {len(csv_files)} CSV files")
         except Exception as e:
             self.logger.error(f"Error scanning directory {self.data_dir}: {e}")
         
         return csv_files
     
-    def run_once(self) -> None:
-        """Run one iteration of file processing."""
-        csv_files = self.scan_csv_files()
+    def run_once(self, force_save: bool = True, complete_tail: bool = True) -> None:
+        """
+        Run one iteration of file processing.
+        
+        Args:
+            force_save: Save the state now instead of waiting for the save interval
+            complete_tail: Read a last line without a newline even from files that
+                changed since the previous poll; continuous runs hold it back
+        """
+        self.process_files(self.scan_csv_files(), force_save, complete_tail)
+    
+    def process_files(self, csv_files: List[Tuple[Path, os.stat_result]],
+                      force_save: bool = True, complete_tail: bool = True) -> None:
+        """
+        Process the given (path, stat) CSV files if they changed and persist the state.
+        
+        Unless force_save is set, the state is written at most once every
+        _save_min_interval seconds. Unless complete_tail is set, a last line
+        without a newline is only read once a poll finds its file unchanged.
+        """
         total_processed = 0
         
-        for csv_file in csv_files:
-            if self.should_process_file(csv_file):
+        for csv_file, stat in csv_files:
+            changed = self.should_process_file(csv_file, stat)
+            # Data left unread in an unchanged file is a finished last line
+            settled_tail = not changed and (
+                self.file_states.get(str(csv_file), {}).get("last_offset", 0) < stat.st_size)
+            if changed or settled_tail:
                 self.logger.info(f"Processing {csv_file.name}")
-                count = self.process_csv_file(csv_file)
+                count = self.process_csv_file(csv_file, complete_tail or settled_tail)
                 total_processed += count
                 self.logger.info(f"Processed {count} new records from {csv_file.name}")
         
-        if total_processed > 0:
+        if force_save or time.time() - self._last_saved_at >= self._save_min_interval:
             self.save_state()
+        if total_processed > 0:
             self.logger.info(f"Total records processed: {total_processed}")
     
     def run_continuous(self) -> None:
-        """Run continuously, polling for new CSV data."""
+        """Run continuously, watching for file events or polling for new CSV data."""
         self.logger.info(f"Starting continuous CSV monitoring on {self.data_dir}")
         self.logger.info(f"Poll interval: {self.poll_interval} seconds")
         
         try:
-            while True:
-                self.run_once()
-                time.sleep(self.poll_interval)
+            if Observer is not None and self.data_dir.is_dir():
+                self.watch()
+            else:
+                while True:
+                    self.run_once(force_save=False, complete_tail=False)
+                    time.sleep(self.poll_interval)
                 
         except KeyboardInterrupt:
             self.logger.info("Shutting down CSV input script")
         except Exception as e:
             self.logger.error(f"Unexpected error: {e}")
             sys.exit(1)
+        finally:
+            # Persist progress still held back by the save interval
+            self.save_state()
+    
+    def watch(self) -> None:
+        """
+        Process CSV files as watchdog reports them created or modified.
+        
+        A full scan still runs every poll_interval seconds without events, to
+        reconcile anything the watcher missed.
+        """
+        changed: "queue.Queue[str]" = queue.Queue()
+        observer = Observer()
+        observer.schedule(CSVChangeHandler(changed), str(self.data_dir), recursive=False)
+        observer.start()
+        self.logger.info("Watching for file events")
+        
+        try:
+            self.run_once(force_save=False, complete_tail=False)
+            while True:
+                try:
+                    file_names = {changed.get(timeout=self.poll_interval)}
+                except queue.Empty:
+                    self.run_once(force_save=False, complete_tail=False)
+                    continue
+                
+                # Coalesce bursts of events for the same files
+                while not changed.empty():
+                    file_names.add(changed.get_nowait())
+                
+                # Build paths the same way scan_csv_files does so state keys match
+                csv_files = []
+                for name in file_names:
+                    csv_file = self.data_dir / name
+                    try:
+                        csv_files.append((csv_file, csv_file.stat()))
+                    except FileNotFoundError:
+                        continue
+                self.process_files(csv_files, force_save=False, complete_tail=False)
+        finally:
+            observer.stop()
+            observer.join()
+
+
+class CSVChangeHandler(FileSystemEventHandler):
+    """Queue names of CSV files reported as created, modified or moved into place."""
+    
+    def __init__(self, changed: "queue.Queue[str]"):
+        super().__init__()
+        self.changed = changed
+    
+    def on_created(self, event) -> None:
+        self.enqueue(event.src_path, event.is_directory)
+    
+    def on_modified(self, event) -> None:
+        self.enqueue(event.src_path, event.is_directory)
+    
+    def on_moved(self, event) -> None:
+        self.enqueue(event.dest_path, event.is_directory)
+    
+    def enqueue(self, path: str, is_directory: bool) -> None:
+        if not is_directory and str(path).endswith('.csv'):
+            self.changed.put(Path(os.fsdecode(path)).name)
 
 def main():
     """Main entry point for Splunk script input."""
@@ -300,6 +532,10 @@ def main():
         # Run once (useful for testing)
         csv_input.run_once()
     else:
+        # Splunk stops scripted inputs with SIGTERM; exit through run_continuous's
+        # cleanup so buffered state is saved
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
         # Run continuously (normal operation)
         csv_input.run_continuous()
 
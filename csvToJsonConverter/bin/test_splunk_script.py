@@ -3,13 +3,20 @@
 Test script for the Splunk CSV input script
 """
 
+import io
 import os
+import sys
 import json
+import contextlib
 import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 
+SCRIPT_PATH = Path(__file__).resolve().parent / "splunk_csv_input.py"
+
+sys.path.insert(0, str(SCRIPT_PATH.parent))
+from splunk_csv_input import SplunkCSVInput
+
 def create_test_csv():
     """Create test CSV files"""
     test_data_dir = Path("test_data")
@@ -22,90 +29,122 @@ def create_test_csv():
 2024-01-15 10:32:00,charlie,download,failed
 2024-01-15 10:33:00,alice,logout,success
 """
-    
+
     with open(test_data_dir / "test1.csv", "w") as f:
         f.write(csv_content)
     
     print(f"Created test CSV file: {test_data_dir / 'test1.csv'}")
     return test_data_dir
 
+def run_once_captured(csv_input, **kwargs):
+    """Run one iteration in-process and return the events written to stdout"""
+    output = io.BytesIO()
+    stdout = io.TextIOWrapper(output, encoding='utf-8')
+    with contextlib.redirect_stdout(stdout):
+        csv_input.run_once(**kwargs)
+    stdout.flush()
+    
+    events = []
+    for line in output.getvalue().decode('utf-8').splitlines():
+        if line.strip():
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Non-JSON output: {line}")
+    return events
+
 def test_script_once():
     """Test the script in 'once' mode"""
     test_data_dir = create_test_csv()
     
-    # Set environment variables
-    env = os.environ.copy()
-    env.update({
-        'CSV_DATA_DIR': str(test_data_dir),
-        'CSV_STATE_DIR': 'test_state',
-        'CSV_RUN_MODE': 'once',
-        'CSV_SOURCETYPE': 'test_csv'
-    })
-    
     try:
-        # Run the script
-        result = subprocess.run(
-            ['python3', 'csvToJsonConverter/bin/splunk_csv_input.py'],
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=30
+        # Run in-process, reusing the same instance and its state across runs
+        csv_input = SplunkCSVInput(
+            data_dir=str(test_data_dir),
+            state_dir='test_state',
+            sourcetype='test_csv'
         )
         
-        print("=== STDOUT (Splunk Events) ===")
-        if result.stdout:
-            for line in result.stdout.strip().split('\n'):
-                if line.strip():
-                    try:
-                        event = json.loads(line)
-                        print(json.dumps(event, indent=2))
-                    except json.JSONDecodeError:
-                        print(f"Non-JSON output: {line}")
-        
-        print("\n=== STDERR (Log Messages) ===")
-        print(result.stderr)
-        
-        print(f"\n=== Return Code: {result.returncode} ===")
+        print("=== Splunk Events ===")
+        events = run_once_captured(csv_input)
+        for event in events:
+            print(json.dumps(event, indent=2))
+        assert len(events) == 4, f"Expected 4 events, got {len(events)}"
         
         # Run again to test incremental processing
         print("\n=== Running Again (Should Process 0 Records) ===")
-        result2 = subprocess.run(
-            ['python3', 'csvToJsonConverter/bin/splunk_csv_input.py'],
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        print("STDOUT:", result2.stdout)
-        print("STDERR:", result2.stderr)
+        events = run_once_captured(csv_input)
+        print(f"Events: {len(events)}")
+        assert not events, f"Expected no events, got {len(events)}"
         
         # Add new data to test incremental processing
         print("\n=== Adding New Data ===")
         with open(test_data_dir / "test1.csv", "a") as f:
             f.write("2024-01-15 10:34:00,dave,register,success\n")
         
-        result3 = subprocess.run(
-            ['python3', 'csvToJsonConverter/bin/splunk_csv_input.py'],
+        events = run_once_captured(csv_input)
+        print("New events:")
+        for event in events:
+            print(json.dumps(event, indent=2))
+        assert len(events) == 1 and events[0]["event"]["user"] == "dave", f"Unexpected events: {events}"
+
+        # A quoted field with an embedded newline is held back until the record is complete
+        print("\n=== Adding A Partially Written Multi-Line Record ===")
+        with open(test_data_dir / "test1.csv", "a") as f:
+            f.write('2024-01-15 10:35:00,eve,"note\n')
+        events = run_once_captured(csv_input, complete_tail=False)
+        assert not events, f"Expected no events, got {events}"
+
+        with open(test_data_dir / "test1.csv", "a") as f:
+            f.write('continued",success\n')
+        events = run_once_captured(csv_input)
+        assert len(events) == 1 and events[0]["event"]["action"] == "note\ncontinued", f"Unexpected events: {events}"
+
+        # Loose quoting that strict parsing rejects is still read, as csv.DictReader did
+        print("\n=== Adding A Loosely Quoted Record ===")
+        with open(test_data_dir / "test1.csv", "a") as f:
+            f.write('2024-01-15 10:35:30,erin,"x"y,success\n2024-01-15 10:35:40,fay,login,success\n')
+        events = run_once_captured(csv_input)
+        assert [event["event"]["action"] for event in events] == ["xy", "login"], f"Unexpected events: {events}"
+
+        # A last line without a newline is held back while the file changes, then read
+        print("\n=== Adding A Record Without A Trailing Newline ===")
+        with open(test_data_dir / "test1.csv", "a") as f:
+            f.write("2024-01-15 10:36:00,frank,upload,success")
+        events = run_once_captured(csv_input, complete_tail=False)
+        assert not events, f"Expected no events, got {events}"
+        events = run_once_captured(csv_input, complete_tail=False)
+        assert len(events) == 1 and events[0]["event"]["user"] == "frank", f"Unexpected events: {events}"
+
+        # Running once reads it straight away, as the file is taken to be complete
+        with open(test_data_dir / "test2.csv", "w") as f:
+            f.write("timestamp,user,action,status\n2024-01-15 10:37:00,grace,login,success")
+        events = run_once_captured(csv_input)
+        assert len(events) == 1 and events[0]["event"]["user"] == "grace", f"Unexpected events: {events}"
+
+        # Run the script itself once to check it works as a standalone Splunk input
+        print("\n=== Running Script (Should Process 0 Records) ===")
+        env = os.environ.copy()
+        env.update({
+            'CSV_DATA_DIR': str(test_data_dir),
+            'CSV_STATE_DIR': 'test_state',
+            'CSV_RUN_MODE': 'once',
+            'CSV_SOURCETYPE': 'test_csv'
+        })
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT_PATH)],
             env=env,
             capture_output=True,
             text=True,
             timeout=30
         )
         
-        print("New events:")
-        if result3.stdout:
-            for line in result3.stdout.strip().split('\n'):
-                if line.strip():
-                    try:
-                        event = json.loads(line)
-                        print(json.dumps(event, indent=2))
-                    except json.JSONDecodeError:
-                        print(f"Non-JSON output: {line}")
-        
-        print("Log messages:")
-        print(result3.stderr)
-        
+        print("STDOUT:", result.stdout)
+        print("STDERR:", result.stderr)
+        print(f"=== Return Code: {result.returncode} ===")
+        assert result.returncode == 0, f"Script exited with {result.returncode}"
+        assert not result.stdout.strip(), "Script reprocessed records already in the saved state"
+    
     finally:
         # Cleanup
         if test_data_dir.exists():
@@ -114,4 +153,4 @@ def test_script_once():
             shutil.rmtree("test_state")
 
 if __name__ == "__main__":
-    test_script_once()
\ No newline at end of file
+    test_script_once()
@@ -5,17 +5,155 @@ Reads CSV files from data directory and converts them to JSON format for Splunk
 """
 
 import os
+import sys
 import csv
-import json
+import gzip
 import logging
 import argparse
-from datetime import datetime
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+import orjson
 import requests
-from typing import Dict, List, Any, Optional
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Optional, Iterable, Iterator, Tuple
 import config
 
-class CSVToSplunkConverter:
+# Read buffer size for CSV input files
+CSV_READ_BUFFER_BYTES = 1024 * 1024
+
+# Key holding the extra fields of a row longer than the header. csv.DictReader's
+# default of None was written out by json as "null"; orjson only accepts string
+# keys, so the same name is used as a string.
+CSV_RESTKEY = "null"
+
+# Write buffer for NDJSON output files; large buffers keep the write syscall count low
+JSON_WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Maximum size of a single HEC request body
+HEC_BATCH_BYTES = 1024 * 1024
+
+# gzip level for HEC request bodies; low levels already shrink CSV-derived JSON several times over
+HEC_GZIP_LEVEL = 3
+
+# Number of HEC batches sent concurrently; kept within the session's connection pool
+HEC_MAX_WORKERS = 8
+
+# Maximum number of batches built but not yet sent
+HEC_MAX_IN_FLIGHT = HEC_MAX_WORKERS * 2
+
+class CSVToJSONConverter:
+    def __init__(self, index_name: str = "main"):
+        """
+        Initialize the CSV to Splunk JSON conversion.
+        
+        Holds no HTTP session, so it is cheap to create in worker processes.
+        
+        Args:
+            index_name: Target Splunk index name
+        """
+        self.index_name = index_name
+        self.logger = logging.getLogger(__name__)
+    
+    def iter_csv_rows(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Read CSV file one row at a time.
+        
+        Rows are mapped onto the header as csv.DictReader does: extra fields are
+        kept as a list under CSV_RESTKEY and missing columns are set to None.
+        
+        Args:
+            file_path: Path to CSV file
+            
+        Yields:
+            Dictionaries representing CSV rows
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8', buffering=CSV_READ_BUFFER_BYTES) as file:
+                csv_reader = csv.reader(file)
+                header = next((fields for fields in csv_reader if fields), None)
+                if header is None:
+                    return
+                
+                # Every row dict shares these key objects
+                header = [sys.intern(name) for name in header]
+                header_len = len(header)
+                
+                for fields in csv_reader:
+                    if fields:
+                        row = dict(zip(header, fields))
+                        if len(fields) > header_len:
+                            row[CSV_RESTKEY] = fields[header_len:]
+                        elif len(fields) < header_len:
+                            for name in header[len(fields):]:
+                                row[name] = None
+                        yield row
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            self.logger.error(f"Error reading CSV file {file_path}: {str(e)}")
+            raise
+    
+    def csv_to_json(self, csv_rows: Iterable[Dict[str, Any]], source_file: str) -> Iterator[Dict[str, Any]]:
+        """
+        Convert CSV rows to Splunk JSON format.
+        
+        Args:
+            csv_rows: Dictionaries from CSV
+            source_file: Source CSV filename
+            
+        Yields:
+            Splunk-formatted JSON events
+        """
+        current_time = time.time()
+        
+        # Splunk event format; everything but the event itself is the same for every row
+        base_event = {
+            "time": current_time,
+            "host": "csv-converter",
+            "source": source_file,
+            "sourcetype": "csv_data",
+            "index": self.index_name
+        }
+        
+        for row in csv_rows:
+            splunk_event = base_event.copy()
+            splunk_event["event"] = row
+            yield splunk_event
+    
+    def save_json_file(self, json_data: Iterable[Dict[str, Any]], output_path: str) -> int:
+        """
+        Save JSON events to file as newline-delimited JSON, one event per line.
+        
+        Args:
+            json_data: JSON events
+            output_path: Output file path
+            
+        Returns:
+            Number of events written
+        """
+        event_count = 0
+        # Events are streamed in while the CSV is still being read, so write to a
+        # temporary file and only replace the output once every event is written
+        tmp_path = f"{output_path}.tmp"
+        try:
+            with open(tmp_path, 'wb', buffering=JSON_WRITE_BUFFER_BYTES) as file:
+                for event in json_data:
+                    file.write(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE))
+                    event_count += 1
+            os.replace(tmp_path, output_path)
+            self.logger.info(f"Saved {event_count} events to {output_path}")
+        except (OSError, orjson.JSONEncodeError) as e:
+            self.logger.error(f"Error saving JSON file {output_path}: {str(e)}")
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        return event_count
+
+class CSVToSplunkConverter(CSVToJSONConverter):
     def __init__(self, splunk_host: str = None, splunk_port: int = 8088, 
                  splunk_token: str = None, index_name: str = "main", protocol: str = "http"):
         """
@@ -31,7 +169,6 @@ class CSVToSplunkConverter:
         self.splunk_host = splunk_host
         self.splunk_port = splunk_port
         self.splunk_token = splunk_token
-        self.index_name = index_name
         self.protocol = protocol.lower()
         self.splunk_url = f"{self.protocol}://{splunk_host}:{splunk_port}/services/collector/event" if splunk_host else None
         
@@ -40,116 +177,146 @@ class CSVToSplunkConverter:
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
-        self.logger = logging.getLogger(__name__)
+        super().__init__(index_name)
+        
+        # Reuse pooled keep-alive connections for all HEC requests
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Splunk {self.splunk_token}',
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip'
+        })
+        if self.protocol == 'https':
+            # HEC commonly runs with a self-signed certificate; skip verification
+            # once for the session and silence the per-request warning it causes
+            self.session.verify = False
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        retries = Retry(total=3, backoff_factor=0.2)
+        self.session.mount(f"{self.protocol}://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
-    def read_csv_file(self, file_path: str) -> List[Dict[str, Any]]:
+    def close(self) -> None:
+        """Close the underlying HTTP session."""
+        self.session.close()
+    
+    def send_to_splunk(self, json_data: Iterable[Dict[str, Any]]) -> bool:
         """
-        Read CSV file and convert to list of dictionaries.
+        Send JSON data to Splunk via HTTP Event Collector.
         
         Args:
-            file_path: Path to CSV file
+            json_data: Splunk-formatted events
             
         Returns:
-            List of dictionaries representing CSV rows
+            True if successful, False otherwise
         """
-        data = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    data.append(dict(row))
-            self.logger.info(f"Successfully read {len(data)} rows from {file_path}")
-        except Exception as e:
-            self.logger.error(f"Error reading CSV file {file_path}: {str(e)}")
-            raise
+        return self.send_payloads(orjson.dumps(event) for event in json_data)
+    
+    def send_json_file(self, json_path: str) -> bool:
+        """
+        Send a newline-delimited JSON file written by save_json_file to Splunk.
         
-        return data
+        Each line already is a serialized event, so it is posted as is.
+        
+        Args:
+            json_path: Path to JSON file
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        with open(json_path, 'rb') as file:
+            return self.send_payloads(line.rstrip(b"\r\n") for line in file if line.strip())
     
-    def csv_to_json(self, csv_data: List[Dict[str, Any]], source_file: str) -> List[Dict[str, Any]]:
+    def send_payloads(self, payloads: Iterable[bytes]) -> bool:
         """
-        Convert CSV data to Splunk JSON format.
+        Send serialized events to Splunk via HTTP Event Collector.
         
         Args:
-            csv_data: List of dictionaries from CSV
-            source_file: Source CSV filename
+            payloads: Splunk-formatted events, each serialized as JSON
             
         Returns:
-            List of Splunk-formatted JSON events
+            True if successful, False otherwise
         """
-        splunk_events = []
-        current_time = datetime.now().timestamp()
+        if not all([self.splunk_host, self.splunk_token]):
+            self.logger.warning("Splunk host or token not configured. Skipping Splunk indexing.")
+            return False
         
-        for row_index, row in enumerate(csv_data):
-            # Create Splunk event format
-            splunk_event = {
-                "time": current_time,
-                "host": "csv-converter",
-                "source": source_file,
-                "sourcetype": "csv_data",
-                "index": self.index_name,
-                "event": row
-            }
-            splunk_events.append(splunk_event)
+        # HEC accepts concatenated events, so send them in batches rather than one
+        # request each, with several batches in flight over the session's pool.
+        # Batches are built only as fast as they are sent, keeping memory bounded.
+        success_count = 0
+        total_count = 0
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=HEC_MAX_WORKERS) as executor:
+            for batch in self.build_batches(payloads):
+                if len(in_flight) >= HEC_MAX_IN_FLIGHT:
+                    sent, event_count = in_flight.popleft().result()
+                    success_count += sent
+                    total_count += event_count
+                in_flight.append(executor.submit(self.post_batch, batch))
+            
+            for future in in_flight:
+                sent, event_count = future.result()
+                success_count += sent
+                total_count += event_count
         
-        self.logger.info(f"Converted {len(splunk_events)} rows to Splunk JSON format")
-        return splunk_events
+        self.logger.info(f"Successfully sent {success_count}/{total_count} events to Splunk")
+        return success_count == total_count
     
-    def save_json_file(self, json_data: List[Dict[str, Any]], output_path: str) -> None:
+    def post_batch(self, batch: Tuple[bytes, int]) -> Tuple[int, int]:
         """
-        Save JSON data to file.
+        Send one batch of events to Splunk via HTTP Event Collector.
         
         Args:
-            json_data: List of JSON events
-            output_path: Output file path
+            batch: Tuple of (request body, number of events in it)
+            
+        Returns:
+            Tuple of (events accepted by Splunk, events in the batch)
         """
+        body, event_count = batch
         try:
-            with open(output_path, 'w', encoding='utf-8') as file:
-                json.dump(json_data, file, indent=2, ensure_ascii=False)
-            self.logger.info(f"JSON data saved to {output_path}")
-        except Exception as e:
-            self.logger.error(f"Error saving JSON file {output_path}: {str(e)}")
-            raise
+            response = self.session.post(
+                self.splunk_url,
+                data=gzip.compress(body, compresslevel=HEC_GZIP_LEVEL),
+                timeout=30
+            )
+            
+            if response.status_code == 200:
+                return event_count, event_count
+            self.logger.error(f"Failed to send {event_count} events to Splunk: {response.status_code} - {response.text}")
+            
+        except requests.RequestException as e:
+            self.logger.error(f"Error sending {event_count} events to Splunk: {str(e)}")
+        
+        return 0, event_count
     
-    def send_to_splunk(self, json_data: List[Dict[str, Any]]) -> bool:
+    def build_batches(self, payloads: Iterable[bytes]) -> Iterator[Tuple[bytes, int]]:
         """
-        Send JSON data to Splunk via HTTP Event Collector.
+        Group serialized events into newline-delimited HEC request bodies.
         
         Args:
-            json_data: List of Splunk-formatted events
+            payloads: Splunk-formatted events, each serialized as JSON
             
-        Returns:
-            True if successful, False otherwise
+        Yields:
+            Tuples of (request body, number of events in it), each body
+            holding up to roughly HEC_BATCH_BYTES of events
         """
-        if not all([self.splunk_host, self.splunk_token]):
-            self.logger.warning("Splunk host or token not configured. Skipping Splunk indexing.")
-            return False
-        
-        headers = {
-            'Authorization': f'Splunk {self.splunk_token}',
-            'Content-Type': 'application/json'
-        }
+        batch = []
+        batch_bytes = 0
+        for payload in payloads:
+            if batch and batch_bytes + len(payload) > HEC_BATCH_BYTES:
+                yield b"\n".join(batch), len(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(payload)
+            batch_bytes += len(payload) + 1
         
-        success_count = 0
-        for event in json_data:
-            try:
-                response = requests.post(
-                    self.splunk_url,
-                    headers=headers,
-                    json=event,
-                    verify=False if self.protocol == 'https' else None,  # Only apply verify for HTTPS
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    success_count += 1
-                else:
-                    self.logger.error(f"Failed to send event to Splunk: {response.status_code} - {response.text}")
-                    
-            except Exception as e:
-                self.logger.error(f"Error sending event to Splunk: {str(e)}")
-        
-        self.logger.info(f"Successfully sent {success_count}/{len(json_data)} events to Splunk")
-        return success_count == len(json_data)
+        if batch:
+            yield b"\n".join(batch), len(batch)
     
     def process_csv_directory(self, data_dir: str = "data", output_dir: str = "json_output") -> None:
         """
@@ -169,36 +336,68 @@ class CSVToSplunkConverter:
             self.logger.error(f"Data directory '{data_dir}' does not exist")
             return
         
-        csv_files = list(data_path.glob("*.csv"))
+        # scandir reuses the directory entry's type info instead of stat-ing each
+        # path, and sorting gives a stable processing order between runs
+        with os.scandir(data_path) as entries:
+            csv_files = sorted(
+                Path(entry.path) for entry in entries
+                if entry.name.endswith('.csv') and entry.is_file()
+            )
         if not csv_files:
             self.logger.warning(f"No CSV files found in '{data_dir}' directory")
             return
         
         self.logger.info(f"Found {len(csv_files)} CSV files to process")
         
-        for csv_file in csv_files:
-            try:
+        # Convert files in parallel worker processes; results are sent to Splunk from
+        # this process, in order, as each file's conversion completes
+        with ProcessPoolExecutor(max_workers=min(len(csv_files), os.cpu_count() or 1)) as executor:
+            conversions = []
+            for csv_file in csv_files:
                 self.logger.info(f"Processing {csv_file.name}")
-                
-                # Read CSV data
-                csv_data = self.read_csv_file(str(csv_file))
-                
-                # Convert to Splunk JSON format
-                json_data = self.csv_to_json(csv_data, csv_file.name)
-                
-                # Save JSON file
-                json_filename = output_path / f"{csv_file.stem}.json"
-                self.save_json_file(json_data, str(json_filename))
-                
-                # Send to Splunk if configured
-                if self.splunk_host and self.splunk_token:
-                    self.send_to_splunk(json_data)
-                
-                self.logger.info(f"Successfully processed {csv_file.name}")
-                
-            except Exception as e:
-                self.logger.error(f"Error processing {csv_file.name}: {str(e)}")
-                continue
+                conversions.append(
+                    (csv_file, executor.submit(convert_csv_file, str(csv_file), str(output_path), self.index_name))
+                )
+            
+            for csv_file, conversion in conversions:
+                try:
+                    json_filename = conversion.result()
+                    
+                    # Send to Splunk if configured, straight from the saved file
+                    if self.splunk_host and self.splunk_token:
+                        self.send_json_file(json_filename)
+                    
+                    self.logger.info(f"Successfully processed {csv_file.name}")
+                    
+                except Exception as e:
+                    self.logger.error(f"Error processing {csv_file.name}: {str(e)}")
+                    continue
+
+def convert_csv_file(csv_path: str, output_dir: str, index_name: str) -> str:
+    """
+    Convert one CSV file to a newline-delimited Splunk JSON file.
+    
+    Defined at module level so it can run in a worker process.
+    
+    Args:
+        csv_path: Path to CSV file
+        output_dir: Directory to save the JSON file
+        index_name: Target Splunk index name
+        
+    Returns:
+        Path of the JSON file written
+    """
+    csv_file = Path(csv_path)
+    json_filename = Path(output_dir) / f"{csv_file.stem}.ndjson"
+    
+    converter = CSVToJSONConverter(index_name=index_name)
+    
+    # Stream CSV rows through the Splunk JSON conversion into the JSON file
+    csv_rows = converter.iter_csv_rows(csv_path)
+    json_data = converter.csv_to_json(csv_rows, csv_file.name)
+    converter.save_json_file(json_data, str(json_filename))
+    
+    return str(json_filename)
 
 def main():
     parser = argparse.ArgumentParser(description="Convert CSV files to JSON and index in Splunk")
@@ -213,16 +412,15 @@ def main():
     args = parser.parse_args()
     
     # Initialize converter
-    converter = CSVToSplunkConverter(
+    with CSVToSplunkConverter(
         splunk_host=args.splunk_host,
         splunk_port=args.splunk_port,
         splunk_token=args.splunk_token,
         index_name=args.index,
         protocol=args.protocol
-    )
-    
-    # Process CSV files
-    converter.process_csv_directory(args.data_dir, args.output_dir)
+    ) as converter:
+        # Process CSV files
+        converter.process_csv_directory(args.data_dir, args.output_dir)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file